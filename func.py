@@ -1,268 +1,395 @@
 import io
 import os
-import json
+import logging
+import orjson
 import oracledb
 from timeit import default_timer as timer
 from fdk import response
 
-# Get connection parameters from enviroment
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-dsn = os.getenv("DSN")
-
-if db_user == None:
-    raise ValueError("ERROR: Missing configuration key DBUSER")
-if db_password == None:
-    raise ValueError("ERROR: Missing configuration key DBPASSWORD")
-if dsn == None:
-    raise ValueError("ERROR: Missing configuration key DSN")
+log = logging.getLogger(__name__)
+# getLevelName() maps a known name to its number; anything else falls back
+log_level = logging.getLevelName(os.getenv("LOG_LEVEL", "WARNING").upper())
+log.setLevel(log_level if isinstance(log_level, int) else logging.WARNING)
 
-print("INFO: db_user is {}".format(db_user), flush=True)
-print("INFO: db_password is {}".format(db_password), flush=True)
-print("INFO: dsn is {}".format(dsn), flush=True)
+# Naive datetimes (e.g. CREATED_ON) are serialized natively as UTC ISO 8601
+ORJSON_OPTS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
 
+# Static response bodies never change, so they are serialized once here
+RESP_UPDATED = b'{"message":"User updated successfully"}'
+RESP_DELETED = b'{"message":"User deleted successfully"}'
+RESP_NOT_FOUND = b'{"message":"User not found"}'
 
-# Create the DB Session Pool
-start_pool = timer()
-dbpool = oracledb.create_pool(user=db_user, password=db_password, dsn=dsn, min=1, max=10) 
-end_pool = timer()
-print("INFO: DB pool created in {} sec".format(end_pool - start_pool), flush=True)
+# Get connection parameters from enviroment
+for key in ("DB_USER", "DB_PASSWORD", "DSN"):
+    if not os.environ.get(key):
+        raise ValueError(f"ERROR: Missing configuration key {key}")
+
+db_user = os.environ["DB_USER"]
+db_password = os.environ["DB_PASSWORD"]
+dsn = os.environ["DSN"]
+# Fixed pool size: once the pool is built it fills to pool_size in the
+# background and never grows, so warm invocations don't open connections
+pool_size = int(os.getenv("POOL_SIZE", "4"))
+
+
+# The async DB Session Pool needs a running event loop, so it cannot be built
+# at container init: it is created on the first invocation (inside the FDK
+# loop) and lives for the lifetime of the container. create_pool_async
+# returns before any connection exists and opens them in a background task:
+# the first acquire() waits for just one connection (and surfaces connect
+# errors right away) while the rest open behind it. Always go through
+# _get_pool(): it is idempotent, and since there is no await between the
+# check and the assignment, concurrent first invocations cannot build two
+# pools.
+# ping_interval=60 only revalidates connections idle for over a minute
+# (e.g. cut by a firewall), so warm acquires skip the ping round-trip.
+_POOL = None
+# Database type of users.ID, looked up once so the ID returned by an insert
+# has the same type as the one GET returns
+_ID_DB_TYPE = None
+
+def _get_pool():
+    global _POOL
+    if _POOL is None:
+        start_pool = timer()
+        _POOL = oracledb.create_pool_async(
+            user=db_user, password=db_password, dsn=dsn,
+            min=pool_size, max=pool_size, increment=0,
+            getmode=oracledb.POOL_GETMODE_WAIT,
+            stmtcachesize=40, ping_interval=60
+        )
+        end_pool = timer()
+        log.info("DB pool created in %s sec", end_pool - start_pool)
+    return _POOL
+
+# SQL statements are kept as module constants so their text is identical
+# across invocations and hits the driver's statement cache
+SQL_INSERT_USER = """
+    INSERT INTO users (ID, FIRST_NAME, LAST_NAME, USERNAME)
+    VALUES (:1, :2, :3, :4)
+"""
+SQL_INSERT_USER_RETURNING = """
+    INSERT INTO users (ID, FIRST_NAME, LAST_NAME, USERNAME)
+    VALUES (:1, :2, :3, :4)
+    RETURNING ID, CREATED_ON INTO :5, :6
+"""
+SQL_DESCRIBE_USER_ID = """
+    SELECT ID
+    FROM users
+    WHERE 1 = 0
+"""
+SQL_SELECT_USER = """
+    SELECT ID, FIRST_NAME, LAST_NAME, USERNAME, CREATED_ON
+    FROM users
+    WHERE ID = :1
+"""
+SQL_SELECT_ALL_USERS = """
+    SELECT ID, FIRST_NAME, LAST_NAME, USERNAME, CREATED_ON
+    FROM users
+"""
+SQL_UPDATE_USER = """
+    UPDATE users
+    SET FIRST_NAME = :1, LAST_NAME = :2, USERNAME = :3
+    WHERE ID = :4
+"""
+SQL_DELETE_USER = """
+    DELETE FROM users
+    WHERE ID = :1
+"""
+
+
+def get_user_id_from_path(ctx):
+    # /.../users/<user_id> -> <user_id>, anything else -> None
+    head, _, last = ctx.RequestURL().rstrip('/').rpartition('/')
+    if head == 'users' or head.endswith('/users'):
+        return last
+    return None
 
 
 #
 # Function Handler: executed every time the function is invoked
 #
-def handler(ctx, data: io.BytesIO = None):
+async def handler(ctx, data: io.BytesIO = None):
     try:
         method = ctx.Method()
-        if method == 'POST':
-            return handle_post(ctx, data)
-        elif method == 'GET':
-            return handle_get(ctx, data)
-        elif method == 'PUT':
-            return handle_put(ctx, data)
-        elif method == 'DELETE':
-            return handle_delete(ctx, data)
+        handler_func = _METHOD_HANDLERS.get(method)
+        if handler_func is None:
+            raise ValueError("Unsupported method: {}".format(method))
+        user_id = get_user_id_from_path(ctx)
+        log.debug("User ID is parsed as %s", user_id)
+        return await handler_func(ctx, data, user_id)
     except Exception as ex:
-        print('ERROR: Invalid payload', ex, flush=True)
+        log.error('Invalid payload: %s', ex)
         raise
     
-def handle_post(ctx, data: io.BytesIO = None):
+async def handle_post(ctx, data: io.BytesIO = None, user_id=None):
+    global _ID_DB_TYPE
     try:
         payload_bytes = data.getvalue()
-        if payload_bytes == b'':
+        if not payload_bytes:
             raise KeyError('No keys in payload')
-        payload = json.loads(payload_bytes)
-        
-        user_id = ''
-        path = ctx.RequestURL()
-        print("INFO: Url path is parsed as {}".format(path), flush=True)
-        path_parts = path.strip('/').split('/')
-        print("INFO: path_parts parsed", flush=True)
-        if len(path_parts) >= 2 and path_parts[-2] == 'users':
-            user_id = path_parts[-1]
-            print("INFO: User ID is parsed as {}".format(user_id), flush=True)
-
-        if user_id == '':
+        payload = orjson.loads(payload_bytes)
+
+        # A list of users is inserted as one batch
+        if isinstance(payload, list):
+            return await create_users(ctx, payload)
+
+        if not user_id:
             raise ValueError("Missing required fields: user_id")
 
-        print(payload, flush=True)
-        first_name = payload.get("first_name")
-        last_name = payload.get("last_name")
-        username = payload.get("username")
-        print("INFO: Mid", flush=True)
-        if not first_name or not last_name or not username:
+        if not isinstance(payload, dict):
+            raise ValueError("Payload must be a JSON object")
+        try:
+            first_name = payload["first_name"]
+            last_name = payload["last_name"]
+            username = payload["username"]
+        except KeyError as k:
+            raise ValueError(f"Missing required field: {k.args[0]}")
+        if not (first_name and last_name and username):
             raise ValueError("Missing required fields: first_name, last_name, username")
 
-        print("INFO: Paramters has been successfully parsed")
-        sql_statement = """
-            INSERT INTO users (ID, FIRST_NAME, LAST_NAME, USERNAME)
-            VALUES (:1, :2, :3, :4)
-        """
+        log.debug("Parameters have been successfully parsed")
         bind_vars = [user_id, first_name, last_name, username]
 
     except Exception as ex:
-        print('ERROR: Invalid payload', ex, flush=True)
+        log.error('Invalid payload: %s', ex)
         raise
 
     try:
-        with dbpool.acquire() as dbconnection:
-            print("INFO: DB connections has been acquired")
+        async with _get_pool().acquire() as dbconnection:
+            log.debug("DB connection has been acquired")
+            # Single statement: commit piggybacks on the execute round-trip
+            dbconnection.autocommit = True
             with dbconnection.cursor() as dbcursor:
-                dbcursor.execute(sql_statement, bind_vars)
-                dbconnection.commit()
+                if _ID_DB_TYPE is None:
+                    await dbcursor.execute(SQL_DESCRIBE_USER_ID)
+                    _ID_DB_TYPE = dbcursor.description[0][1]
+                # ID and the server-generated CREATED_ON come back with the
+                # insert, so the created row is returned without a follow-up SELECT
+                returned_id = dbcursor.var(_ID_DB_TYPE)
+                created_on = dbcursor.var(oracledb.DB_TYPE_TIMESTAMP)
+                await dbcursor.execute(SQL_INSERT_USER_RETURNING, bind_vars + [returned_id, created_on])
+                result = {
+                    "ID": returned_id.getvalue()[0],
+                    "FIRST_NAME": first_name,
+                    "LAST_NAME": last_name,
+                    "USERNAME": username,
+                    "CREATED_ON": created_on.getvalue()[0]
+                }
                 return response.Response(
                     ctx,
-                    response_data=json.dumps({"message": "User created successfully"}),
+                    response_data=orjson.dumps(result, option=ORJSON_OPTS),
                     headers={"Content-Type": "application/json"}
                 )
     except Exception as ex:
-        print('ERROR: Failed to create user', ex, flush=True)
+        log.error('Failed to create user: %s', ex)
         raise
 
-def handle_get(ctx, data: io.BytesIO = None):
+async def create_users(ctx, users):
     try:
-        user_id = None
-        path = ctx.RequestURL()
-        path_parts = path.strip('/').split('/')
-        if len(path_parts) >= 2 and path_parts[-2] == 'users':
-            user_id = path_parts[-1]
+        bind_vars = []
+        for user in users:
+            if not isinstance(user, dict):
+                raise ValueError("Each user in the payload must be a JSON object")
+            try:
+                user_id = user["id"]
+                first_name = user["first_name"]
+                last_name = user["last_name"]
+                username = user["username"]
+            except KeyError as k:
+                raise ValueError(f"Missing required field: {k.args[0]}")
+            if not (user_id and first_name and last_name and username):
+                raise ValueError("Missing required fields: id, first_name, last_name, username")
+            bind_vars.append((user_id, first_name, last_name, username))
+
+        if not bind_vars:
+            raise ValueError("No users in payload")
+
+        async with _get_pool().acquire() as dbconnection:
+            # Pooled connections keep the flag set by single-statement
+            # writes; the batch commits explicitly after collecting errors
+            dbconnection.autocommit = False
+            with dbconnection.cursor() as dbcursor:
+                # One round-trip for the whole batch; rows that fail are
+                # reported back instead of aborting the rest
+                await dbcursor.executemany(SQL_INSERT_USER, bind_vars, batcherrors=True)
+                errors = [
+                    {"index": error.offset, "error": error.message}
+                    for error in dbcursor.getbatcherrors()
+                ]
+                await dbconnection.commit()
+
+                created = len(bind_vars) - len(errors)
+                if not errors:
+                    message, status_code = "Users created successfully", 200
+                elif created:
+                    message, status_code = "Some users could not be created", 207
+                else:
+                    message, status_code = "No users were created", 400
+                return response.Response(
+                    ctx,
+                    response_data=orjson.dumps({
+                        "message": message,
+                        "created": created,
+                        "errors": errors
+                    }, option=ORJSON_OPTS),
+                    headers={"Content-Type": "application/json"},
+                    status_code=status_code
+                )
 
+    except Exception as ex:
+        log.error('Failed to create users: %s', ex)
+        raise
+
+async def handle_get(ctx, data: io.BytesIO = None, user_id=None):
+    try:
         if not user_id:
-            return read_all_users(ctx)
+            return await read_all_users(ctx)
         else:
-            return read_user(ctx, user_id)
+            return await read_user(ctx, user_id)
     except Exception as ex:
-        print('ERROR: Invalid payload', ex, flush=True)
+        log.error('Invalid payload: %s', ex)
         raise
     
 
-def read_user(ctx, user_id):
+async def read_user(ctx, user_id):
     try:
-        sql_statement = """
-            SELECT ID, FIRST_NAME, LAST_NAME, USERNAME, CREATED_ON
-            FROM users
-            WHERE ID = :1
-        """
         bind_vars = [user_id]
 
-        with dbpool.acquire() as dbconnection:
+        async with _get_pool().acquire() as dbconnection:
             with dbconnection.cursor() as dbcursor:
-                dbcursor.execute(sql_statement, bind_vars)
-                dbcursor.rowfactory = lambda *args: dict(zip([d[0] for d in dbcursor.description], args))
-                result = dbcursor.fetchone()
+                # ID is the primary key: at most one row comes back
+                dbcursor.prefetchrows = 2
+                dbcursor.arraysize = 2
+                await dbcursor.execute(SQL_SELECT_USER, bind_vars)
+                columns = [d[0] for d in dbcursor.description]
+                dbcursor.rowfactory = lambda *args, _columns=columns: dict(zip(_columns, args))
+                result = await dbcursor.fetchone()
 
                 if result:
-                    if result.get("CREATED_ON"):
-                        result["CREATED_ON"] = result["CREATED_ON"].isoformat()
-
                     return response.Response(
                         ctx,
-                        response_data=json.dumps(result),
+                        response_data=orjson.dumps(result, option=ORJSON_OPTS),
                         headers={"Content-Type": "application/json"}
                     )
                 else:
                     return response.Response(
                         ctx,
-                        response_data=json.dumps({"message": "User not found"}),
+                        response_data=RESP_NOT_FOUND,
                         headers={"Content-Type": "application/json"}
                     )
 
     except Exception as ex:
-        print('ERROR: Failed to read user', ex, flush=True)
+        log.error('Failed to read user: %s', ex)
         raise
 
-def read_all_users(ctx):
+async def read_all_users(ctx):
     try:
-        sql_statement = """
-            SELECT ID, FIRST_NAME, LAST_NAME, USERNAME, CREATED_ON
-            FROM users
-        """
-
-        with dbpool.acquire() as dbconnection:
+        async with _get_pool().acquire() as dbconnection:
             with dbconnection.cursor() as dbcursor:
-                dbcursor.execute(sql_statement)
-                dbcursor.rowfactory = lambda *args: dict(zip([d[0] for d in dbcursor.description], args))
-                results = dbcursor.fetchall()
-
-                for result in results:
-                    if result.get("CREATED_ON"):
-                        result["CREATED_ON"] = result["CREATED_ON"].isoformat()
+                # Rows are streamed in fetches of 500 and serialized one at a
+                # time, so only the JSON output grows with the table size
+                dbcursor.arraysize = 500
+                dbcursor.prefetchrows = 500
+                await dbcursor.execute(SQL_SELECT_ALL_USERS)
+                columns = [d[0] for d in dbcursor.description]
+
+                results = bytearray(b'[')
+                async for row in dbcursor:
+                    if len(results) > 1:
+                        results += b','
+                    results += orjson.dumps(dict(zip(columns, row)), option=ORJSON_OPTS)
+                results += b']'
 
                 return response.Response(
                     ctx,
-                    response_data=json.dumps(results),
+                    response_data=results,
                     headers={"Content-Type": "application/json"}
                 )
 
     except Exception as ex:
-        print('ERROR: Failed to read all users', ex, flush=True)
+        log.error('Failed to read all users: %s', ex)
         raise
 
-def handle_put(ctx, data: io.BytesIO = None):
+async def handle_put(ctx, data: io.BytesIO = None, user_id=None):
     try:
         payload_bytes = data.getvalue()
-        if payload_bytes == b'':
+        if not payload_bytes:
             raise KeyError('No keys in payload')
-        payload = json.loads(payload_bytes)
+        payload = orjson.loads(payload_bytes)
 
-        return update_user(ctx, payload)
+        return await update_user(ctx, payload, user_id)
     except Exception as ex:
-        print('ERROR: Invalid payload', ex, flush=True)
+        log.error('Invalid payload: %s', ex)
         raise
 
-def update_user(ctx, payload):
+async def update_user(ctx, payload, user_id):
     try:
-        user_id = None
-        path = ctx.RequestURL()
-        path_parts = path.strip('/').split('/')
-        if len(path_parts) >= 2 and path_parts[-2] == 'users':
-            user_id = path_parts[-1]
-
         if not user_id:
             raise ValueError("Missing required fields: user_id")
-        
-        first_name = payload.get("first_name")
-        last_name = payload.get("last_name")
-        username = payload.get("username")
-
-        sql_statement = """
-            UPDATE users
-            SET FIRST_NAME = :1, LAST_NAME = :2, USERNAME = :3
-            WHERE ID = :4
-        """
+
+        if not isinstance(payload, dict):
+            raise ValueError("Payload must be a JSON object")
+        try:
+            first_name = payload["first_name"]
+            last_name = payload["last_name"]
+            username = payload["username"]
+        except KeyError as k:
+            raise ValueError(f"Missing required field: {k.args[0]}")
+        if not (first_name and last_name and username):
+            raise ValueError("Missing required fields: first_name, last_name, username")
+
         bind_vars = [first_name, last_name, username, user_id]
 
-        with dbpool.acquire() as dbconnection:
+        async with _get_pool().acquire() as dbconnection:
+            dbconnection.autocommit = True
             with dbconnection.cursor() as dbcursor:
-                dbcursor.execute(sql_statement, bind_vars)
-                dbconnection.commit()
+                await dbcursor.execute(SQL_UPDATE_USER, bind_vars)
                 return response.Response(
                     ctx,
-                    response_data=json.dumps({"message": "User updated successfully"}),
+                    response_data=RESP_UPDATED,
                     headers={"Content-Type": "application/json"}
                 )
 
     except Exception as ex:
-        print('ERROR: Failed to update user', ex, flush=True)
+        log.error('Failed to update user: %s', ex)
         raise
     
-def handle_delete(ctx, data: io.BytesIO = None):
+async def handle_delete(ctx, data: io.BytesIO = None, user_id=None):
     try:
-        user_id = None
-        path = ctx.RequestURL()
-        path_parts = path.strip('/').split('/')
-        if len(path_parts) >= 2 and path_parts[-2] == 'users':
-            user_id = path_parts[-1]
-
         if not user_id:
             raise ValueError("Missing required field: user_id")
 
-        return delete_user(ctx, user_id)
+        return await delete_user(ctx, user_id)
     except Exception as ex:
-        print('ERROR: Invalid payload', ex, flush=True)
+        log.error('Invalid payload: %s', ex)
         raise
     
 
-def delete_user(ctx, user_id):
+async def delete_user(ctx, user_id):
     try:
 
-        sql_statement = """
-            DELETE FROM users
-            WHERE ID = :1
-        """
         bind_vars = [user_id]
 
-        with dbpool.acquire() as dbconnection:
+        async with _get_pool().acquire() as dbconnection:
+            dbconnection.autocommit = True
             with dbconnection.cursor() as dbcursor:
-                dbcursor.execute(sql_statement, bind_vars)
-                dbconnection.commit()
+                await dbcursor.execute(SQL_DELETE_USER, bind_vars)
                 return response.Response(
                     ctx,
-                    response_data=json.dumps({"message": "User deleted successfully"}),
+                    response_data=RESP_DELETED,
                     headers={"Content-Type": "application/json"}
                 )
 
     except Exception as ex:
-        print('ERROR: Failed to delete user', ex, flush=True)
+        log.error('Failed to delete user: %s', ex)
         raise
+
+
+# Built once at import; handler() dispatches with a single dict lookup
+_METHOD_HANDLERS = {
+    'POST': handle_post,
+    'GET': handle_get,
+    'PUT': handle_put,
+    'DELETE': handle_delete
+}